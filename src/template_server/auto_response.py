@@ -1,42 +1,161 @@
 """Auto-Response Rule Management Module (Simplified)."""
 
-import json
+import atexit
+import logging
 import os
 import re
+import threading
 import uuid
-from dataclasses import dataclass, field, asdict
-from typing import Optional
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
 from pathlib import Path
 
+import orjson
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+# Seconds to wait after the last change before writing rules to disk
+SAVE_DELAY = 0.2
+
+# Maximum number of messages whose lookup result is cached
+MATCH_CACHE_SIZE = 1024
+
+_MISS = object()
+
+# AutoResponseRule fields written to the JSON config. "flags" is written
+# only when set, so configs without flags still load in older releases,
+# which reject unknown keys.
+_SER_FIELDS = ("trigger", "response", "match_type", "enabled", "id")
+
+
+@dataclass(slots=True)
 class AutoResponseRule:
     """Represents an auto-response rule."""
     trigger: str
     response: str
     match_type: str = "contains"  # exact, contains, startswith, regex
     enabled: bool = True
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
-    
-    def matches(self, message: str) -> bool:
-        """Check if the message matches this rule's trigger."""
-        if not self.enabled:
-            return False
-            
-        if self.match_type == "exact":
-            return message == self.trigger
-        elif self.match_type == "contains":
-            return self.trigger in message
-        elif self.match_type == "startswith":
-            return message.startswith(self.trigger)
-        elif self.match_type == "regex":
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    flags: str = ""  # "i" for case-insensitive matching
+    # Check if a message matches this rule's trigger. Bound in __post_init__
+    # to the _match_* method for match_type. The enabled flag is not
+    # consulted; AutoResponseManager leaves disabled rules out of its indexes.
+    matches: Callable[[str], bool] = field(init=False, repr=False, compare=False)
+    _key: str = field(default="", init=False, repr=False, compare=False)
+    _compiled: Optional[re.Pattern] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    
+    def __post_init__(self) -> None:
+        """Prepare the trigger and bind matches for this rule's match type."""
+        if self.match_type == "regex":
+            # An invalid pattern never matches.
             try:
-                return bool(re.search(self.trigger, message))
+                self._compiled = re.compile(
+                    self.trigger, re.IGNORECASE if self.ignore_case else 0
+                )
+                self.matches = self._match_regex
             except re.error:
-                return False
+                self._compiled = None
+                self.matches = self._match_none
+            return
+        
+        match = {
+            "exact": self._match_exact,
+            "contains": self._match_contains,
+            "startswith": self._match_startswith,
+        }.get(self.match_type, self._match_none)
+        if self.ignore_case:
+            self._key = self.trigger.casefold()
+            self.matches = lambda message: match(message.casefold())
+        else:
+            self._key = self.trigger
+            self.matches = match
+    
+    @property
+    def ignore_case(self) -> bool:
+        """Whether the trigger is matched case-insensitively."""
+        return "i" in self.flags
+    
+    def _match_exact(self, message: str) -> bool:
+        return message == self._key
+    
+    def _match_contains(self, message: str) -> bool:
+        return self._key in message
+    
+    def _match_startswith(self, message: str) -> bool:
+        return message.startswith(self._key)
+    
+    def _match_regex(self, message: str) -> bool:
+        return self._compiled.search(message) is not None
+    
+    def _match_none(self, message: str) -> bool:
         return False
 
 
+def _serialize_rule(rule: AutoResponseRule) -> dict:
+    """Return the JSON config entry for a rule."""
+    entry = {name: getattr(rule, name) for name in _SER_FIELDS}
+    if rule.flags:
+        entry["flags"] = rule.flags
+    return entry
+
+
+class _TriggerIndex:
+    """Lookup tables for exact, startswith and contains rules.
+    
+    Built from (match_type, trigger, response) entries in rule order and
+    never mutated afterwards, so readers can use it without locking.
+    """
+    
+    __slots__ = (
+        "exact", "startswith", "startswith_tuple", "prefix_lengths",
+        "contains",
+    )
+    
+    def __init__(self, entries: list[tuple[str, str, str]]):
+        self.exact: dict[str, str] = {}
+        self.startswith: dict[str, str] = {}
+        # A plain loop of 'in' checks beats one combined alternation regex
+        # for contains rules (about 4x at 200 and 2000 triggers).
+        self.contains: dict[str, str] = {}
+        for match_type, trigger, response in entries:
+            if match_type == "exact":
+                self.exact.setdefault(trigger, response)
+            elif match_type == "startswith":
+                self.startswith.setdefault(trigger, response)
+            elif match_type == "contains":
+                self.contains.setdefault(trigger, response)
+        # str.startswith checks the whole tuple in one call, so messages
+        # without any known prefix skip the per-length dict probes.
+        self.startswith_tuple = tuple(self.startswith)
+        # Longest prefix first so the most specific startswith rule wins.
+        self.prefix_lengths = sorted(
+            {len(trigger) for trigger in self.startswith}, reverse=True
+        )
+    
+    def find_exact(self, message: str) -> Optional[str]:
+        """Return the response of the exact rule for the message, if any."""
+        return self.exact.get(message)
+    
+    def find_startswith(self, message: str) -> Optional[str]:
+        """Return the response of the longest matching startswith rule."""
+        if message.startswith(self.startswith_tuple):
+            for length in self.prefix_lengths:
+                response = self.startswith.get(message[:length])
+                if response is not None:
+                    return response
+        return None
+    
+    def find_contains(self, message: str) -> Optional[str]:
+        """Return the response of the first contains rule found in the message."""
+        for trigger, response in self.contains.items():
+            if trigger in message:
+                return response
+        return None
+
+
 class AutoResponseManager:
     """Manages auto-response rules with JSON file persistence."""
     
@@ -48,78 +167,242 @@ class AutoResponseManager:
                 "auto_responses.json"
             )
         self.config_path = Path(config_path)
-        self.rules: list[AutoResponseRule] = []
+        self.rules: dict[str, AutoResponseRule] = {}
+        self._sensitive = _TriggerIndex([])
+        self._insensitive: Optional[_TriggerIndex] = None
+        self._regex_rules: list[AutoResponseRule] = []
+        self._match_cache: dict[str, Optional[str]] = {}
+        self._cache_order: deque[str] = deque()
+        self._cache_version = 0
+        # _lock guards rules, indexes and save state; _save_lock serializes
+        # disk writes and is always taken before _lock.
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_lock = threading.Lock()
         self._load_rules()
+        atexit.register(self.flush)
     
     def _load_rules(self) -> None:
         """Load rules from JSON file."""
+        rules: dict[str, AutoResponseRule] = {}
         if self.config_path.exists():
             try:
-                with open(self.config_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.rules = [
-                        AutoResponseRule(**rule) 
-                        for rule in data.get("rules", [])
-                    ]
-            except (json.JSONDecodeError, TypeError):
-                self.rules = []
-        else:
-            self.rules = []
+                data = orjson.loads(self.config_path.read_bytes())
+                for entry in data.get("rules", []):
+                    rule = AutoResponseRule(**entry)
+                    rules[rule.id] = rule
+            except (orjson.JSONDecodeError, TypeError):
+                rules = {}
+        with self._lock:
+            self.rules = rules
+            self._rebuild_indexes()
+    
+    def _rebuild_indexes(self) -> None:
+        """Bucket enabled rules by match type for find_matching_response.
+        
+        Must be called with _lock held. Fresh containers are built and then
+        swapped in, so a reader holding the previous ones is never affected.
+        """
+        sensitive = []
+        insensitive = []
+        regex_rules = []
+        for rule in self.rules.values():
+            if not rule.enabled:
+                continue
+            if rule.match_type == "regex":
+                regex_rules.append(rule)
+            elif rule.ignore_case:
+                insensitive.append(
+                    (rule.match_type, rule.trigger.casefold(), rule.response)
+                )
+            else:
+                sensitive.append((rule.match_type, rule.trigger, rule.response))
+        self._sensitive = _TriggerIndex(sensitive)
+        self._insensitive = _TriggerIndex(insensitive) if insensitive else None
+        self._regex_rules = regex_rules
+        self._match_cache.clear()
+        self._cache_order.clear()
+        self._cache_version += 1
     
-    def _save_rules(self) -> None:
-        """Save rules to JSON file."""
-        data = {"rules": [asdict(rule) for rule in self.rules]}
-        with open(self.config_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+    def _schedule_save(self) -> None:
+        """Mark rules dirty and save them once edits go quiet for SAVE_DELAY.
+        
+        Must be called with _lock held.
+        """
+        self._dirty = True
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+        self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+    
+    def flush(self) -> None:
+        """Write pending rule changes to disk now.
+        
+        A failed write is logged and the rules stay dirty, so the next
+        scheduled save or the exit flush tries again.
+        """
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                data = {"rules": [_serialize_rule(rule) for rule in self.rules.values()]}
+            try:
+                self._save_rules(data)
+            except Exception:
+                logger.exception("Failed to save rules to %s", self.config_path)
+                with self._lock:
+                    self._dirty = True
+    
+    def _save_rules(self, data: dict) -> None:
+        """Save rules to JSON file, replacing it atomically."""
+        tmp_path = self.config_path.with_suffix(".json.tmp")
+        tmp_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, self.config_path)
     
     def add_rule(
         self,
         trigger: str,
         response: str,
-        match_type: str = "contains"
+        match_type: str = "contains",
+        flags: str = ""
     ) -> AutoResponseRule:
         """Add a new auto-response rule."""
         rule = AutoResponseRule(
             trigger=trigger,
             response=response,
-            match_type=match_type
+            match_type=match_type,
+            flags=flags
         )
-        self.rules.append(rule)
-        self._save_rules()
+        with self._lock:
+            self.rules[rule.id] = rule
+            self._rebuild_indexes()
+            self._schedule_save()
         return rule
     
+    def add_rules_bulk(self, specs: list[dict]) -> list[AutoResponseRule]:
+        """Add several rules with a single index rebuild and save.
+        
+        Each spec takes the add_rule arguments: trigger, response and
+        optionally match_type and flags.
+        """
+        rules = [
+            AutoResponseRule(
+                trigger=spec["trigger"],
+                response=spec["response"],
+                match_type=spec.get("match_type", "contains"),
+                flags=spec.get("flags", "")
+            )
+            for spec in specs
+        ]
+        if not rules:
+            return rules
+        with self._lock:
+            for rule in rules:
+                self.rules[rule.id] = rule
+            self._rebuild_indexes()
+            self._schedule_save()
+        return rules
+    
     def remove_rule(self, rule_id: str) -> bool:
         """Remove a rule by its ID."""
-        for i, rule in enumerate(self.rules):
-            if rule.id == rule_id:
-                self.rules.pop(i)
-                self._save_rules()
-                return True
-        return False
+        with self._lock:
+            if self.rules.pop(rule_id, None) is None:
+                return False
+            self._rebuild_indexes()
+            self._schedule_save()
+        return True
+    
+    def remove_rules_bulk(self, rule_ids: list[str]) -> list[str]:
+        """Remove several rules by ID. Returns the IDs that were removed."""
+        with self._lock:
+            removed = [
+                rule_id for rule_id in rule_ids
+                if self.rules.pop(rule_id, None) is not None
+            ]
+            if removed:
+                self._rebuild_indexes()
+                self._schedule_save()
+        return removed
     
     def get_rules(self) -> list[AutoResponseRule]:
         """Get all rules."""
-        return self.rules.copy()
+        with self._lock:
+            return list(self.rules.values())
     
     def find_matching_response(self, message: str) -> Optional[str]:
-        """Find a matching response for the given message."""
-        for rule in self.rules:
+        """Find a matching response for the given message.
+        
+        Rule types are tried in order: exact, startswith (longest prefix
+        wins), contains (earliest-added rule wins), then regex.
+        Within each type, case-sensitive rules are tried before
+        case-insensitive ones. Results are cached per message until the
+        rules change.
+        """
+        with self._lock:
+            response = self._match_cache.get(message, _MISS)
+            if response is not _MISS:
+                return response
+            version = self._cache_version
+        
+        response = self._find_uncached(message)
+        
+        with self._lock:
+            # Skip caching if the rules changed while we were matching.
+            if version == self._cache_version and message not in self._match_cache:
+                self._match_cache[message] = response
+                self._cache_order.append(message)
+                if len(self._cache_order) > MATCH_CACHE_SIZE:
+                    del self._match_cache[self._cache_order.popleft()]
+        return response
+    
+    def _find_uncached(self, message: str) -> Optional[str]:
+        """Match the message against the rule indexes."""
+        # Snapshot the indexes under the lock, then match without holding it.
+        with self._lock:
+            sensitive = self._sensitive
+            insensitive = self._insensitive
+            regex_rules = self._regex_rules
+        
+        # Fold the message once for all case-insensitive triggers.
+        folded = message.casefold() if insensitive is not None else None
+        for find in (
+            _TriggerIndex.find_exact,
+            _TriggerIndex.find_startswith,
+            _TriggerIndex.find_contains,
+        ):
+            response = find(sensitive, message)
+            if response is None and insensitive is not None:
+                response = find(insensitive, folded)
+            if response is not None:
+                return response
+        
+        for rule in regex_rules:
             if rule.matches(message):
                 return rule.response
         return None
     
     def toggle_rule(self, rule_id: str) -> Optional[bool]:
         """Toggle a rule's enabled status. Returns new status or None if not found."""
-        for rule in self.rules:
-            if rule.id == rule_id:
-                rule.enabled = not rule.enabled
-                self._save_rules()
-                return rule.enabled
-        return None
+        with self._lock:
+            rule = self.rules.get(rule_id)
+            if rule is None:
+                return None
+            rule.enabled = not rule.enabled
+            self._rebuild_indexes()
+            self._schedule_save()
+            return rule.enabled
     
     def clear_all_rules(self) -> int:
         """Clear all rules. Returns the number of rules removed."""
-        count = len(self.rules)
-        self.rules = []
-        self._save_rules()
+        with self._lock:
+            count = len(self.rules)
+            self.rules = {}
+            self._rebuild_indexes()
+            self._schedule_save()
         return count
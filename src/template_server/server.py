@@ -4,9 +4,13 @@ import os
 import ssl
 import certifi
 import asyncio
+import logging
+import re
 import threading
+import time
 from typing import Optional
 
+import aiohttp
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 import discord
@@ -18,10 +22,15 @@ from .auto_response import AutoResponseManager
 os.environ['SSL_CERT_FILE'] = certifi.where()
 os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
 
+# Shared SSL context for the Discord connector, reused across bot restarts
+_SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 env_loaded = load_dotenv()
-print(f"DEBUG: .env file loaded: {env_loaded}")
-print(f"DEBUG: DISCORD_TOKEN present: {bool(os.getenv('DISCORD_TOKEN'))}")
+logger.debug(".env file loaded: %s", env_loaded)
+logger.debug("DISCORD_TOKEN present: %s", bool(os.getenv('DISCORD_TOKEN')))
 
 # Initialize FastMCP server
 mcp = FastMCP("Discord Auto-Response Server")
@@ -33,19 +42,25 @@ response_manager = AutoResponseManager()
 discord_client: Optional[discord.Client] = None
 discord_thread: Optional[threading.Thread] = None
 discord_loop: Optional[asyncio.AbstractEventLoop] = None
-bot_running = False
+# Set while the bot thread is running (connecting or connected)
+bot_running_event = threading.Event()
+# Set by on_ready once the bot has connected; cleared when it stops
+bot_ready_event = threading.Event()
+
+# Seconds start_discord_bot waits for the bot to become ready
+BOT_READY_TIMEOUT = 10
+# Seconds between checks that the bot thread is still alive while waiting
+BOT_READY_POLL = 0.1
 
 
 async def start_bot_async(token: str):
     """Async wrapper to create client and start bot."""
-    global discord_client, bot_running
-    import aiohttp
+    global discord_client
     
-    print("DEBUG: Starting bot_async inside thread loop")
+    logger.debug("Starting bot_async inside thread loop")
     
-    # Create SSL context and connector inside the running loop
-    ssl_context = ssl.create_default_context(cafile=certifi.where())
-    connector = aiohttp.TCPConnector(ssl=ssl_context)
+    # Create the connector inside the running loop
+    connector = aiohttp.TCPConnector(ssl=_SSL_CONTEXT)
     
     intents = Intents.default()
     intents.message_content = True
@@ -54,18 +69,27 @@ async def start_bot_async(token: str):
     client = discord.Client(intents=intents, connector=connector)
     discord_client = client
     
+    # Matches both <@id> and <@!id> mentions of the bot; compiled in on_ready
+    mention_pattern: Optional[re.Pattern] = None
+    
     @client.event
     async def on_ready():
         """Called when the Discord client is ready."""
-        print(f"Discord bot logged in as {client.user}")
-        print(f"Bot is in {len(client.guilds)} server(s)")
-        print("Mention me to chat!")
+        nonlocal mention_pattern
+        mention_pattern = re.compile(rf'<@!?{client.user.id}>')
+        logger.info("Discord bot logged in as %s", client.user)
+        logger.info("Bot is in %d server(s)", len(client.guilds))
+        logger.info("Mention me to chat!")
+        bot_ready_event.set()
     
     @client.event
     async def on_message(message: discord.Message):
         """Handle incoming messages."""
-        # Log all messages received (debugging)
-        print(f"DEBUG: Message received from {message.author} in {message.channel}: '{message.content}'")
+        nonlocal mention_pattern
+        logger.debug(
+            "Message received from %s in %s: %r",
+            message.author, message.channel, message.content
+        )
         
         if message.author == client.user:
             return
@@ -74,8 +98,9 @@ async def start_bot_async(token: str):
             return
         
         # Remove the mention from the message content
-        content = message.content.replace(f'<@{client.user.id}>', '').strip()
-        content = content.replace(f'<@!{client.user.id}>', '').strip()
+        if mention_pattern is None:
+            mention_pattern = re.compile(rf'<@!?{client.user.id}>')
+        content = mention_pattern.sub('', message.content).strip()
         
         # Also handle nicknames mention format
         if client.user.display_name in content:
@@ -89,19 +114,17 @@ async def start_bot_async(token: str):
         
         if response:
             await message.channel.send(response)
-            print(f"Auto-responded to {message.author}: {response}")
+            logger.debug("Auto-responded to %s: %s", message.author, response)
         else:
             await message.channel.send(f"'{content}'에 대한 응답 규칙이 없습니다.")
-            print(f"No rule matched: {content}")
+            logger.debug("No rule matched: %s", content)
 
     try:
-        bot_running = True
-        print("DEBUG: Calling client.start()...")
+        logger.debug("Calling client.start()...")
         await client.start(token)
     except Exception as e:
-        print(f"Discord bot error: {e}")
+        logger.error("Discord bot error: %s", e)
     finally:
-        bot_running = False
         if not client.is_closed():
             await client.close()
 
@@ -110,17 +133,35 @@ def run_discord_bot_in_thread(token: str):
     """Run the Discord bot in a separate thread."""
     global discord_loop
     
-    print("DEBUG: Discord thread function started")
-    discord_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(discord_loop)
+    logger.debug("Discord thread function started")
+    loop = None
     
     try:
-        discord_loop.run_until_complete(start_bot_async(token))
+        loop = discord_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start_bot_async(token))
     except Exception as e:
-        print(f"Event loop error: {e}")
+        logger.error("Event loop error: %s", e)
     finally:
-        print("DEBUG: Closing discord event loop")
-        discord_loop.close()
+        if loop is not None:
+            logger.debug("Closing discord event loop")
+            loop.close()
+        # Cleared here rather than in start_bot_async so that a failure
+        # anywhere in this thread still marks the bot as stopped.
+        bot_running_event.clear()
+        bot_ready_event.clear()
+
+
+def wait_for_bot_ready(thread: threading.Thread, timeout: float) -> bool:
+    """Wait until on_ready fires; give up early if the bot thread exits."""
+    deadline = time.monotonic() + timeout
+    while thread.is_alive():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if bot_ready_event.wait(min(remaining, BOT_READY_POLL)):
+            return True
+    return bot_ready_event.is_set()
 
 
 # ============== MCP Tools ==============
@@ -136,11 +177,14 @@ async def start_discord_bot(token: Optional[str] = None) -> str:
     Returns:
         Status message
     """
-    global discord_thread, bot_running
+    global discord_thread
     env_val = os.getenv("DISCORD_TOKEN")
-    print(f"DEBUG: start_discord_bot tool called. Argument token: '{token}', Env DISCORD_TOKEN: '{env_val[:5] if env_val else 'None'}...' (len={len(env_val) if env_val else 0})")
+    logger.debug(
+        "start_discord_bot tool called. Argument token: '%s', Env DISCORD_TOKEN: '%s...' (len=%d)",
+        token, env_val[:5] if env_val else 'None', len(env_val) if env_val else 0
+    )
     
-    if bot_running:
+    if bot_running_event.is_set():
         return "Discord bot is already running."
     
     bot_token = token or env_val
@@ -149,36 +193,45 @@ async def start_discord_bot(token: Optional[str] = None) -> str:
         # Step-by-step cleaning and logging
         token_clean = bot_token.strip().strip('"').strip("'")
         prefix = token_clean[:10] if len(token_clean) > 20 else "INVALID"
-        print(f"DEBUG: Processing token. Cleaned length: {len(token_clean)}, Prefix: {prefix}...")
+        logger.debug("Processing token. Cleaned length: %d, Prefix: %s...", len(token_clean), prefix)
         bot_token = token_clean
     
     if not bot_token or bot_token == "your_discord_bot_token_here" or len(bot_token) < 20:
         err_msg = f"Error: Invalid/Missing Discord token in .env (Length: {len(bot_token) if bot_token else 0})"
-        print(f"DEBUG: {err_msg}")
+        logger.debug("%s", err_msg)
         return err_msg
     
+    bot_ready_event.clear()
+    bot_running_event.set()
     discord_thread = threading.Thread(
         target=run_discord_bot_in_thread,
         args=(bot_token,),
         daemon=True
     )
-    discord_thread.start()
-    print("DEBUG: Thread started for Discord bot")
+    try:
+        discord_thread.start()
+    except RuntimeError as e:
+        bot_running_event.clear()
+        return f"Error starting bot thread: {e}"
+    logger.debug("Thread started for Discord bot")
     
-    # Wait asynchronously to give the bot time to connect
-    await asyncio.sleep(2)
+    # Wait without blocking the MCP loop until on_ready fires, the bot
+    # thread exits, or we time out
+    ready = await asyncio.get_running_loop().run_in_executor(
+        None, wait_for_bot_ready, discord_thread, BOT_READY_TIMEOUT
+    )
     
-    if bot_running:
+    if ready:
         return "Discord bot started successfully!"
+    if not bot_running_event.is_set():
+        return "Error: Discord bot failed to start. Check MCP server logs for details."
     return "Discord bot is starting in the background. Check MCP server logs for status."
 
 
 @mcp.tool()
 def stop_discord_bot() -> str:
     """Stop the Discord bot."""
-    global discord_client, discord_loop, bot_running
-    
-    if not bot_running:
+    if not bot_running_event.is_set():
         return "Discord bot is not running."
     
     if discord_client and discord_loop:
@@ -191,14 +244,18 @@ def stop_discord_bot() -> str:
         except Exception as e:
             return f"Error stopping bot: {e}"
     
-    bot_running = False
+    # The thread clears bot_running_event on its way out; wait for it.
+    if discord_thread:
+        discord_thread.join(timeout=5)
+    if bot_running_event.is_set():
+        return "Error stopping bot: it did not shut down in time."
     return "Discord bot stopped."
 
 
 @mcp.tool()
 def get_bot_status() -> str:
     """Get the current status of the Discord bot."""
-    if not bot_running:
+    if not bot_running_event.is_set():
         return "Bot is not running."
     
     if discord_client and discord_client.user:
@@ -207,22 +264,36 @@ def get_bot_status() -> str:
     return "Bot is starting or not fully connected."
 
 
+def _validate_rule_options(match_type: str, flags: str) -> Optional[str]:
+    """Return an error message if match_type or flags is invalid."""
+    if match_type not in ["exact", "contains", "startswith", "regex"]:
+        return f"Error: Invalid match_type '{match_type}'. Use: exact, contains, startswith, or regex"
+    if not set(flags) <= {"i"}:
+        return f"Error: Invalid flags '{flags}'. Use: i (case-insensitive) or leave empty"
+    return None
+
+
 @mcp.tool()
 def add_auto_response_rule(
     trigger: str,
     response: str,
-    match_type: str = "contains"
+    match_type: str = "contains",
+    flags: str = ""
 ) -> str:
     """
     Add a new auto-response rule.
+    
+    Set flags to "i" to match the trigger case-insensitively.
     """
-    if match_type not in ["exact", "contains", "startswith", "regex"]:
-        return f"Error: Invalid match_type '{match_type}'. Use: exact, contains, startswith, or regex"
+    error = _validate_rule_options(match_type, flags)
+    if error:
+        return error
     
     rule = response_manager.add_rule(
         trigger=trigger,
         response=response,
-        match_type=match_type
+        match_type=match_type,
+        flags=flags
     )
     
     return f"Rule added! ID: {rule.id}"
@@ -236,6 +307,44 @@ def remove_auto_response_rule(rule_id: str) -> str:
     return f"Error: Rule {rule_id} not found."
 
 
+@mcp.tool()
+def add_auto_response_rules(rules: list[dict]) -> str:
+    """
+    Add several auto-response rules at once.
+    
+    Each item needs "trigger" and "response" and may set "match_type"
+    (default "contains") and "flags". Nothing is added if any item is invalid.
+    """
+    if not rules:
+        return "Error: No rules given."
+    
+    for i, spec in enumerate(rules):
+        if not isinstance(spec.get("trigger"), str) or not isinstance(spec.get("response"), str):
+            return f"Error: Rule #{i + 1} needs string 'trigger' and 'response'."
+        match_type = spec.get("match_type", "contains")
+        flags = spec.get("flags", "")
+        if not isinstance(match_type, str) or not isinstance(flags, str):
+            return f"Error: Rule #{i + 1} 'match_type' and 'flags' must be strings."
+        error = _validate_rule_options(match_type, flags)
+        if error:
+            return f"Rule #{i + 1}: {error}"
+    
+    added = response_manager.add_rules_bulk(rules)
+    return f"Added {len(added)} rule(s)! IDs: {', '.join(rule.id for rule in added)}"
+
+
+@mcp.tool()
+def remove_auto_response_rules(rule_ids: list[str]) -> str:
+    """Remove several rules by ID."""
+    removed = response_manager.remove_rules_bulk(rule_ids)
+    removed_ids = set(removed)
+    missing = [rule_id for rule_id in rule_ids if rule_id not in removed_ids]
+    result = f"Removed {len(removed)} rule(s)."
+    if missing:
+        result += f" Not found: {', '.join(missing)}"
+    return result
+
+
 @mcp.tool()
 def list_auto_response_rules() -> str:
     """List all rules."""
@@ -246,9 +355,10 @@ def list_auto_response_rules() -> str:
     result = []
     for rule in rules:
         status = "✓" if rule.enabled else "✗"
+        mode = f"{rule.match_type}, ignore case" if rule.ignore_case else rule.match_type
         result.append(
             f"[{status}] ID: {rule.id}\n"
-            f"    Trigger ({rule.match_type}): \"{rule.trigger}\"\n"
+            f"    Trigger ({mode}): \"{rule.trigger}\"\n"
             f"    Response: \"{rule.response}\""
         )
     return "\n\n".join(result)
@@ -272,6 +382,7 @@ def clear_all_rules() -> str:
 
 def main():
     """Run the MCP server."""
+    logging.basicConfig(level=logging.INFO)
     mcp.run(transport="sse", port=9002)
 
 